@@ -1,9 +1,18 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, request, session, current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Integer, Float, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from datetime import datetime, timedelta
-import random
+from sqlalchemy import String, Integer, BigInteger, Float, DateTime, ForeignKey, Boolean, Index, insert, update, bindparam, select, union_all, lambda_stmt, func, inspect, cast
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, selectinload, raiseload, aliased
+from datetime import datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+import hmac
+import orjson
+
+from cache import cache
 
 # Database setup
 class Base(DeclarativeBase):
@@ -11,14 +20,23 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+def utcnow():
+    # One timestamp per request (or job), shared by every insert it makes.
+    # Naive UTC, like the DateTime columns and the rows datetime.utcnow() wrote before.
+    if not has_app_context():
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if 'now' not in g:
+        g.now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return g.now
+
 # User model
 class User(Base):
     __tablename__ = 'users'
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     username: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
-    pin: Mapped[str] = mapped_column(String(4), nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    pin: Mapped[str] = mapped_column(String(128), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     
     # Relationships
     accounts: Mapped[list['Account']] = relationship('Account', back_populates='owner')
@@ -27,19 +45,23 @@ class User(Base):
         return {
             'id': self.id,
             'username': self.username,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 # Account model
 class Account(Base):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        Index('ix_acct_user_type', 'user_id', 'account_type'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     account_number: Mapped[str] = mapped_column(String(20), unique=True, nullable=False)
     account_type: Mapped[str] = mapped_column(String(20), nullable=False, default='personal')
-    balance: Mapped[float] = mapped_column(Float, default=250000.0)
+    # Balances and amounts are stored as integer cents
+    balance: Mapped[int] = mapped_column(BigInteger, default=25000000)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     
     # Relationships
     owner: Mapped['User'] = relationship('User', back_populates='accounts')
@@ -51,49 +73,63 @@ class Account(Base):
             'id': self.id,
             'account_number': self.account_number,
             'account_type': self.account_type,
-            'balance': self.balance,
+            'balance': self.balance / 100,
             'user_id': self.user_id,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 class Transaction(Base):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('ix_tx_from_created', 'from_account_id', 'created_at'),
+        Index('ix_tx_to_created', 'to_account_id', 'created_at'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     from_account_id: Mapped[int] = mapped_column(Integer, ForeignKey('accounts.id'), nullable=False)
     to_account_id: Mapped[int] = mapped_column(Integer, ForeignKey('accounts.id'), nullable=False)
-    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
     description: Mapped[str] = mapped_column(String(255), default='')
     transaction_type: Mapped[str] = mapped_column(String(20), default='transfer')
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     
     # Relationships
     from_account: Mapped['Account'] = relationship('Account', foreign_keys=[from_account_id], back_populates='sent_transactions')
     to_account: Mapped['Account'] = relationship('Account', foreign_keys=[to_account_id], back_populates='received_transactions')
     
+    # Columns read by transaction_row_to_dict(); list endpoints select just these as plain rows
+    _FIELDS = ('id', 'from_account_id', 'to_account_id', 'amount', 'description', 'transaction_type', 'created_at')
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'from_account_id': self.from_account_id,
-            'to_account_id': self.to_account_id,
-            'amount': self.amount,
-            'description': self.description,
-            'transaction_type': self.transaction_type,
-            'created_at': self.created_at.isoformat()
-        }
+        return transaction_row_to_dict(self)
+
+def transaction_row_to_dict(row):
+    # Works on Transaction instances and on plain result rows selecting Transaction._FIELDS
+    return {
+        'id': row.id,
+        'from_account_id': row.from_account_id,
+        'to_account_id': row.to_account_id,
+        'amount': row.amount / 100,
+        'description': row.description,
+        'transaction_type': row.transaction_type,
+        'created_at': row.created_at
+    }
 
 class RecurringPayment(Base):
     __tablename__ = 'recurring_payments'
+    __table_args__ = (
+        Index('ix_rp_active_due', 'is_active', 'next_payment_date'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    from_account_id: Mapped[int] = mapped_column(Integer, ForeignKey('accounts.id'), nullable=False)
+    from_account_id: Mapped[int] = mapped_column(Integer, ForeignKey('accounts.id'), nullable=False, index=True)
     to_account_id: Mapped[int] = mapped_column(Integer, ForeignKey('accounts.id'), nullable=False)
-    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
     description: Mapped[str] = mapped_column(String(255), default='')
     frequency: Mapped[str] = mapped_column(String(20), default='monthly')
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     next_payment_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     
     # Relationships
     from_account: Mapped['Account'] = relationship('Account', foreign_keys=[from_account_id])
@@ -104,22 +140,214 @@ class RecurringPayment(Base):
             'id': self.id,
             'from_account_id': self.from_account_id,
             'to_account_id': self.to_account_id,
-            'amount': self.amount,
+            'amount': self.amount / 100,
             'description': self.description,
             'frequency': self.frequency,
             'is_active': self.is_active,
-            'next_payment_date': self.next_payment_date.isoformat(),
-            'created_at': self.created_at.isoformat(),
+            'next_payment_date': self.next_payment_date,
+            'created_at': self.created_at,
             'from_account_number': self.from_account.account_number,
             'to_account_number': self.to_account.account_number,
             'recipient_username': self.to_account.owner.username
         }
 
+# Records one-off data migrations that have been applied to this database
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+
+def migrate_amounts_to_cents():
+    # Databases created before amounts moved to integer cents still have Float columns
+    # holding currency units. Convert them once; the marker row is inserted first so a
+    # second run, or a concurrent worker starting up, leaves the data alone.
+    columns = {column['name']: column['type'] for column in inspect(db.engine).get_columns('accounts')}
+    if not isinstance(columns['balance'], Float):
+        return False
+    if db.session.get(SchemaMigration, 'amounts_to_cents') is not None:
+        return False
+    
+    try:
+        db.session.add(SchemaMigration(id='amounts_to_cents'))
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    
+    # The column types themselves are not changed. On SQLite the old tables keep REAL affinity,
+    # which stores even these integer results as floating point, so their rows still read back
+    # as whole-number floats (24999820.0) until the tables are rebuilt.
+    db.session.execute(update(Account).values(balance=cast(func.round(Account.balance * 100), BigInteger)))
+    db.session.execute(update(Transaction).values(amount=cast(func.round(Transaction.amount * 100), BigInteger)))
+    db.session.execute(update(RecurringPayment).values(amount=cast(func.round(RecurringPayment.amount * 100), BigInteger)))
+    db.session.commit()
+    return True
+
+def create_missing_indexes():
+    # create_all() skips tables that already exist, so indexes added to the models later
+    # never reach older databases. IF NOT EXISTS lets every worker run this at startup.
+    with db.engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
 # Blueprint for routes
 bank_bp = Blueprint('bank', __name__)
 
-def generate_account_number():
-    return str(random.randint(100000000, 999999999))
+def ojson(obj, status=200):
+    # orjson serializes datetimes natively (RFC 3339) and is much faster than stdlib json
+    return Response(
+        orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
+
+# Body for empty list responses. A fresh Response is still built per request,
+# since after_request hooks (e.g. session cookies) mutate it.
+EMPTY_LIST_JSON = b'[]'
+
+def empty_list_response():
+    return Response(EMPTY_LIST_JSON, mimetype='application/json')
+
+# Hot lookups are built once as lambda statements so their compiled SQL is cached and reused
+account_by_number_stmt = lambda_stmt(lambda: select(Account).where(
+    Account.account_number == bindparam('account_number')
+))
+account_by_id_stmt = lambda_stmt(lambda: select(Account).where(
+    Account.id == bindparam('account_id')
+))
+accounts_by_user_stmt = lambda_stmt(lambda: select(Account).where(
+    Account.user_id == bindparam('user_id')
+))
+first_account_id_by_user_stmt = lambda_stmt(lambda: select(Account.id).where(
+    Account.user_id == bindparam('user_id')
+).limit(1))
+user_by_username_stmt = lambda_stmt(lambda: select(User).where(
+    User.username == bindparam('username')
+))
+
+def _account_ref(key, stmt, params):
+    # Only the immutable identity of an account is cached, never its balance
+    def load():
+        account = db.session.execute(stmt, params).scalar_one_or_none()
+        if not account:
+            return None
+        return {
+            'id': account.id,
+            'user_id': account.user_id,
+            'account_type': account.account_type
+        }
+    return cache.get_or_set(key, load)
+
+def get_account_ref_by_number(account_number):
+    return _account_ref(f'acct:num:{account_number}', account_by_number_stmt, {'account_number': account_number})
+
+def get_account_ref_by_id(account_id):
+    return _account_ref(f'acct:id:{account_id}', account_by_id_stmt, {'account_id': account_id})
+
+def debit_account(account_id, amount):
+    # Atomic check-and-debit; returns the new balance, or None if funds are insufficient
+    return db.session.execute(
+        update(Account)
+        .where(Account.id == account_id, Account.balance >= amount)
+        .values(balance=Account.balance - amount)
+        .returning(Account.balance)
+    ).scalar_one_or_none()
+
+def credit_account(account_id, amount):
+    return db.session.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(balance=Account.balance + amount)
+        .returning(Account.balance)
+    ).scalar_one()
+
+# Interval between recurring payments for each supported frequency
+FREQ_DELTA = {
+    'weekly': timedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'yearly': relativedelta(years=1)
+}
+
+def advance_payment_date(anchor, previous, frequency):
+    # Calendar intervals are counted from the anchor (the creation time) rather than chained from
+    # the previous date, so a payment set up on the 31st goes Jan 31 -> Feb 29 -> Mar 31.
+    # Rows scheduled before that (utcnow() + 30 days, taken just before created_at) are not on
+    # the anchor's schedule; they keep stepping from the previous date so no payment repeats.
+    delta = FREQ_DELTA[frequency]
+    if isinstance(delta, timedelta) or anchor is None:
+        return previous + delta
+    step = delta.years * 12 + delta.months
+    n = ((previous.year - anchor.year) * 12 + previous.month - anchor.month) // step
+    if n < 1 or anchor + relativedelta(months=n * step) != previous:
+        return previous + delta
+    return anchor + relativedelta(months=(n + 1) * step)
+
+# Largest amount accepted from the API, far below the BigInteger limit of the cents columns
+MAX_AMOUNT_CENTS = 10 ** 15
+
+def to_cents(amount):
+    # API amounts are decimal currency units; the database stores integer cents
+    try:
+        cents = Decimal(str(amount)) * 100
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {amount!r}')
+    if not cents.is_finite() or abs(cents) > MAX_AMOUNT_CENTS:
+        raise ValueError(f'Invalid amount: {amount!r}')
+    return int(cents.to_integral_value(rounding=ROUND_HALF_UP))
+
+# PINs are stored as argon2 hashes; users are looked up by username only and verified here
+pin_hasher = PasswordHasher(time_cost=2, memory_cost=19456)
+# Verified against when the username doesn't exist, so unknown and known users take equally long
+DUMMY_PIN_HASH = pin_hasher.hash('0000')
+
+def verify_pin(user, pin):
+    pin = str(pin)
+    if user is None:
+        try:
+            pin_hasher.verify(DUMMY_PIN_HASH, pin)
+        except VerifyMismatchError:
+            pass
+        return False
+    
+    try:
+        pin_hasher.verify(user.pin, pin)
+    except VerifyMismatchError:
+        return False
+    except InvalidHashError:
+        # Rows created before hashing still hold the plaintext PIN; upgrade them on success
+        if not hmac.compare_digest(user.pin.encode(), pin.encode()):
+            return False
+        user.pin = pin_hasher.hash(pin)
+        return True
+    
+    if pin_hasher.check_needs_rehash(user.pin):
+        user.pin = pin_hasher.hash(pin)
+    return True
+
+# Account numbers are 9 scrambled digits plus a Luhn check digit. The scramble is a
+# bijection on [10^8, 10^9), so distinct sequence values never collide, and the
+# 10-digit result can't clash with the 9-digit random numbers issued previously.
+ACCOUNT_NUMBER_BASE = 100000000
+ACCOUNT_NUMBER_SPACE = 900000000
+ACCOUNT_NUMBER_MULTIPLIER = 7368787  # coprime with ACCOUNT_NUMBER_SPACE
+ACCOUNT_NUMBER_OFFSET = 314159265
+
+def luhn_check_digit(digits):
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        d = int(d)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return str((10 - total % 10) % 10)
+
+def generate_account_number(seq):
+    body = str(ACCOUNT_NUMBER_BASE + (seq * ACCOUNT_NUMBER_MULTIPLIER + ACCOUNT_NUMBER_OFFSET) % ACCOUNT_NUMBER_SPACE)
+    return body + luhn_check_digit(body)
 
 @bank_bp.route('/register', methods=['POST'])
 def register():
@@ -129,39 +357,40 @@ def register():
     account_type = data.get('account_type', 'personal')
     
     if not username or not pin:
-        return jsonify({'error': 'Username and PIN are required'}), 400
+        return ojson({'error': 'Username and PIN are required'}), 400
     
     if len(pin) != 4 or not pin.isdigit():
-        return jsonify({'error': 'PIN must be exactly 4 digits'}), 400
+        return ojson({'error': 'PIN must be exactly 4 digits'}), 400
     
-    # Check if username already exists
-    existing_user = User.query.filter_by(username=username).first()
-    if existing_user:
-        return jsonify({'error': 'Username already exists'}), 400
-    
-    # Create new user
-    user = User(username=username, pin=pin)
-    db.session.add(user)
-    db.session.flush()
+    # Create new user; RETURNING hands back the generated id and defaults without a flush.
+    # The unique constraint on username rejects duplicates, so no existence check is needed up front.
+    try:
+        user = db.session.execute(
+            insert(User).values(username=username, pin=pin_hasher.hash(pin)).returning(User)
+        ).scalar_one()
+    except IntegrityError:
+        db.session.rollback()
+        return ojson({'error': 'Username already exists'}), 400
     
     # Create account for the user
-    account_number = generate_account_number()
-    while Account.query.filter_by(account_number=account_number).first():
-        account_number = generate_account_number()
-    
-    account = Account(
-        account_number=account_number,
-        account_type=account_type,
-        user_id=user.id
-    )
-    db.session.add(account)
-    db.session.commit()
-    
-    return jsonify({
+    # Registration creates exactly one account per user, so the user id serves as the sequence
+    account = db.session.execute(
+        insert(Account).values(
+            account_number=generate_account_number(user.id),
+            account_type=account_type,
+            user_id=user.id
+        ).returning(Account)
+    ).scalar_one()
+    
+    # Serialize before commit so the expired instances aren't reloaded
+    response = {
         'message': 'User and account created successfully',
         'user': user.to_dict(),
         'account': account.to_dict()
-    }), 201
+    }
+    db.session.commit()
+    
+    return ojson(response), 201
 
 @bank_bp.route('/login', methods=['POST'])
 def login():
@@ -170,16 +399,23 @@ def login():
     pin = data.get('pin')
     
     if not username or not pin:
-        return jsonify({'error': 'Username and PIN are required'}), 400
+        return ojson({'error': 'Username and PIN are required'}), 400
+    
+    user = db.session.execute(user_by_username_stmt, {'username': username}).scalar_one_or_none()
+    if not verify_pin(user, pin):
+        return ojson({'error': 'Invalid username or PIN'}), 401
     
-    user = User.query.filter_by(username=username, pin=pin).first()
-    if not user:
-        return jsonify({'error': 'Invalid username or PIN'}), 401
+    # Persist a PIN hash upgraded during verification
+    if db.session.is_modified(user):
+        db.session.commit()
     
+    # Server-side sessions outlive a logout, so issue a fresh session id on every login
+    if hasattr(current_app.session_interface, 'regenerate'):
+        current_app.session_interface.regenerate(session)
     session['user_id'] = user.id
-    accounts = Account.query.filter_by(user_id=user.id).all()
+    accounts = db.session.execute(accounts_by_user_stmt, {'user_id': user.id}).scalars().all()
     
-    return jsonify({
+    return ojson({
         'message': 'Login successful',
         'user': user.to_dict(),
         'accounts': [account.to_dict() for account in accounts]
@@ -188,12 +424,12 @@ def login():
 @bank_bp.route('/logout', methods=['POST'])
 def logout():
     session.pop('user_id', None)
-    return jsonify({'message': 'Logged out successfully'}), 200
+    return ojson({'message': 'Logged out successfully'}), 200
 
 @bank_bp.route('/transfer', methods=['POST'])
 def transfer():
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     data = request.get_json()
     from_account_number = data.get('from_account_number')
@@ -202,59 +438,59 @@ def transfer():
     description = data.get('description', '')
     
     if not all([from_account_number, to_account_number, amount]):
-        return jsonify({'error': 'From account, to account, and amount are required'}), 400
+        return ojson({'error': 'From account, to account, and amount are required'}), 400
     
     try:
-        amount = float(amount)
+        amount = to_cents(amount)
         if amount <= 0:
-            return jsonify({'error': 'Amount must be positive'}), 400
+            return ojson({'error': 'Amount must be positive'}), 400
     except ValueError:
-        return jsonify({'error': 'Invalid amount'}), 400
+        return ojson({'error': 'Invalid amount'}), 400
     
     # Verify from account belongs to current user
-    from_account = Account.query.filter_by(
-        account_number=from_account_number, 
-        user_id=session['user_id']
-    ).first()
+    from_account = get_account_ref_by_number(from_account_number)
     
-    if not from_account:
-        return jsonify({'error': 'From account not found or not owned by you'}), 404
+    if not from_account or from_account['user_id'] != session['user_id']:
+        return ojson({'error': 'From account not found or not owned by you'}), 404
     
     # Verify to account exists
-    to_account = Account.query.filter_by(account_number=to_account_number).first()
+    to_account = get_account_ref_by_number(to_account_number)
     if not to_account:
-        return jsonify({'error': 'Recipient account not found'}), 404
+        return ojson({'error': 'Recipient account not found'}), 404
     
-    # Check sufficient balance
-    if from_account.balance < amount:
-        return jsonify({'error': 'Insufficient balance'}), 400
-    
-    # Perform transfer
-    from_account.balance -= amount
-    to_account.balance += amount
+    # Perform transfer; the debit only applies if the balance covers it
+    new_balance = debit_account(from_account['id'], amount)
+    if new_balance is None:
+        return ojson({'error': 'Insufficient balance'}), 400
+    to_balance = credit_account(to_account['id'], amount)
+    # A transfer to the same account nets out to its credited balance
+    if to_account['id'] == from_account['id']:
+        new_balance = to_balance
     
     # Create transaction record
-    transaction = Transaction(
-        from_account_id=from_account.id,
-        to_account_id=to_account.id,
-        amount=amount,
-        description=description,
-        transaction_type='transfer'
-    )
-    
-    db.session.add(transaction)
-    db.session.commit()
-    
-    return jsonify({
+    transaction = db.session.execute(
+        insert(Transaction).values(
+            from_account_id=from_account['id'],
+            to_account_id=to_account['id'],
+            amount=amount,
+            description=description,
+            transaction_type='transfer'
+        ).returning(Transaction)
+    ).scalar_one()
+    
+    response = {
         'message': 'Transfer successful',
         'transaction': transaction.to_dict(),
-        'new_balance': from_account.balance
-    }), 200
+        'new_balance': new_balance / 100
+    }
+    db.session.commit()
+    
+    return ojson(response), 200
 
 @bank_bp.route('/charge', methods=['POST'])
 def charge():
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     data = request.get_json()
     business_account_number = data.get('business_account_number')
@@ -265,88 +501,120 @@ def charge():
     description = data.get('description', '')
     
     if not all([business_account_number, customer_username, customer_pin, amount]):
-        return jsonify({'error': 'Business account, customer username, customer PIN, and amount are required'}), 400
+        return ojson({'error': 'Business account, customer username, customer PIN, and amount are required'}), 400
     
     try:
-        amount = float(amount)
+        amount = to_cents(amount)
         if amount <= 0:
-            return jsonify({'error': 'Amount must be positive'}), 400
+            return ojson({'error': 'Amount must be positive'}), 400
     except ValueError:
-        return jsonify({'error': 'Invalid amount'}), 400
+        return ojson({'error': 'Invalid amount'}), 400
     
     # Verify business account belongs to current user
-    business_account = Account.query.filter_by(
-        account_number=business_account_number, 
-        user_id=session['user_id'],
-        account_type='business'
-    ).first()
+    business_account = get_account_ref_by_number(business_account_number)
     
-    if not business_account:
-        return jsonify({'error': 'Business account not found or not owned by you'}), 404
+    if (not business_account
+            or business_account['user_id'] != session['user_id']
+            or business_account['account_type'] != 'business'):
+        return ojson({'error': 'Business account not found or not owned by you'}), 404
     
     # Verify customer credentials
-    customer = User.query.filter_by(username=customer_username, pin=customer_pin).first()
-    if not customer:
-        return jsonify({'error': 'Invalid customer credentials'}), 401
+    customer = db.session.execute(user_by_username_stmt, {
+        'username': customer_username
+    }).scalar_one_or_none()
+    if not verify_pin(customer, customer_pin):
+        return ojson({'error': 'Invalid customer credentials'}), 401
     
     # Get customer's account (first account found)
-    customer_account = Account.query.filter_by(user_id=customer.id).first()
-    if not customer_account:
-        return jsonify({'error': 'Customer account not found'}), 404
-    
-    # Check customer has sufficient balance
-    if customer_account.balance < amount:
-        return jsonify({'error': 'Customer has insufficient balance'}), 400
-    
-    # Perform charge
-    customer_account.balance -= amount
-    business_account.balance += amount
+    customer_account_id = db.session.execute(first_account_id_by_user_stmt, {
+        'user_id': customer.id
+    }).scalar_one_or_none()
+    if customer_account_id is None:
+        return ojson({'error': 'Customer account not found'}), 404
+    
+    # Perform charge; the debit only applies if the customer's balance covers it
+    customer_new_balance = debit_account(customer_account_id, amount)
+    if customer_new_balance is None:
+        return ojson({'error': 'Customer has insufficient balance'}), 400
+    business_new_balance = credit_account(business_account['id'], amount)
+    # Charging an account to itself nets out to its credited balance
+    if customer_account_id == business_account['id']:
+        customer_new_balance = business_new_balance
     
     # Create transaction record with reason
     full_description = f'INVOICE: {reason}'
     if description:
         full_description += f' - {description}'
     
-    transaction = Transaction(
-        from_account_id=customer_account.id,
-        to_account_id=business_account.id,
-        amount=amount,
-        description=full_description,
-        transaction_type='charge'
-    )
-    
-    db.session.add(transaction)
-    db.session.commit()
-    
-    return jsonify({
+    transaction = db.session.execute(
+        insert(Transaction).values(
+            from_account_id=customer_account_id,
+            to_account_id=business_account['id'],
+            amount=amount,
+            description=full_description,
+            transaction_type='charge'
+        ).returning(Transaction)
+    ).scalar_one()
+    
+    response = {
         'message': 'Customer charged successfully',
         'transaction': transaction.to_dict(),
-        'business_new_balance': business_account.balance,
-        'customer_new_balance': customer_account.balance
-    }), 200
+        'business_new_balance': business_new_balance / 100,
+        'customer_new_balance': customer_new_balance / 100
+    }
+    db.session.commit()
+    
+    return ojson(response), 200
 
 @bank_bp.route('/accounts/<int:account_id>/transactions', methods=['GET'])
 def get_account_transactions(account_id):
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     # Verify account belongs to current user
-    account = Account.query.filter_by(id=account_id, user_id=session['user_id']).first()
-    if not account:
-        return jsonify({'error': 'Account not found or not owned by you'}), 404
+    account = get_account_ref_by_id(account_id)
+    if not account or account['user_id'] != session['user_id']:
+        return ojson({'error': 'Account not found or not owned by you'}), 404
+    
+    # Without a limit the full history is returned, as the frontend expects
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 500)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    # Get transactions for this account as two index-backed legs instead of an OR filter.
+    # When paging, each leg only needs the newest limit + offset rows; self-transfers come from the first leg only.
+    sent = select(Transaction).where(
+        Transaction.from_account_id == account_id
+    ).order_by(Transaction.created_at.desc())
+    received = select(Transaction).where(
+        Transaction.to_account_id == account_id,
+        Transaction.from_account_id != account_id
+    ).order_by(Transaction.created_at.desc())
+    if limit is not None:
+        sent = sent.limit(limit + offset)
+        received = received.limit(limit + offset)
+    sent = sent.subquery()
+    received = received.subquery()
+    
+    combined = aliased(Transaction, union_all(select(sent), select(received)).subquery())
+    # Plain rows skip ORM instance construction and identity-map bookkeeping
+    rows = db.session.execute(
+        select(*[getattr(combined, field) for field in Transaction._FIELDS])
+        .order_by(combined.created_at.desc(), combined.id.desc())
+        .limit(limit)
+        .offset(offset)
+    ).all()
     
-    # Get all transactions for this account
-    transactions = Transaction.query.filter(
-        (Transaction.from_account_id == account_id) | 
-        (Transaction.to_account_id == account_id)
-    ).order_by(Transaction.created_at.desc()).all()
+    if not rows:
+        return empty_list_response(), 200
     
-    return jsonify([transaction.to_dict() for transaction in transactions]), 200
+    return ojson([transaction_row_to_dict(row) for row in rows]), 200
 
 @bank_bp.route('/recurring_payments', methods=['POST'])
 def create_recurring_payment():
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     data = request.get_json()
     business_account_number = data.get('business_account_number')
@@ -356,46 +624,38 @@ def create_recurring_payment():
     frequency = data.get('frequency', 'monthly')
     
     if not all([business_account_number, recipient_account_number, amount]):
-        return jsonify({'error': 'Business account, recipient account, and amount are required'}), 400
+        return ojson({'error': 'Business account, recipient account, and amount are required'}), 400
     
     try:
-        amount = float(amount)
+        amount = to_cents(amount)
         if amount <= 0:
-            return jsonify({'error': 'Amount must be positive'}), 400
+            return ojson({'error': 'Amount must be positive'}), 400
     except ValueError:
-        return jsonify({'error': 'Invalid amount'}), 400
+        return ojson({'error': 'Invalid amount'}), 400
     
-    if frequency not in ['weekly', 'monthly', 'yearly']:
-        return jsonify({'error': 'Frequency must be weekly, monthly, or yearly'}), 400
+    if not isinstance(frequency, str) or frequency not in FREQ_DELTA:
+        return ojson({'error': 'Frequency must be weekly, monthly, or yearly'}), 400
     
     # Verify business account belongs to current user
-    business_account = Account.query.filter_by(
-        account_number=business_account_number, 
-        user_id=session['user_id'],
-        account_type='business'
-    ).first()
+    business_account = get_account_ref_by_number(business_account_number)
     
-    if not business_account:
-        return jsonify({'error': 'Business account not found or not owned by you'}), 404
+    if (not business_account
+            or business_account['user_id'] != session['user_id']
+            or business_account['account_type'] != 'business'):
+        return ojson({'error': 'Business account not found or not owned by you'}), 404
     
     # Verify recipient account exists
-    recipient_account = Account.query.filter_by(account_number=recipient_account_number).first()
+    recipient_account = get_account_ref_by_number(recipient_account_number)
     if not recipient_account:
-        return jsonify({'error': 'Recipient account not found'}), 404
+        return ojson({'error': 'Recipient account not found'}), 404
     
     # Calculate next payment date
-    next_payment = datetime.utcnow()
-    if frequency == 'weekly':
-        next_payment += timedelta(weeks=1)
-    elif frequency == 'monthly':
-        next_payment += timedelta(days=30)
-    elif frequency == 'yearly':
-        next_payment += timedelta(days=365)
+    next_payment = utcnow() + FREQ_DELTA[frequency]
     
     # Create recurring payment
     recurring_payment = RecurringPayment(
-        from_account_id=business_account.id,
-        to_account_id=recipient_account.id,
+        from_account_id=business_account['id'],
+        to_account_id=recipient_account['id'],
         amount=amount,
         description=description,
         frequency=frequency,
@@ -405,7 +665,7 @@ def create_recurring_payment():
     db.session.add(recurring_payment)
     db.session.commit()
     
-    return jsonify({
+    return ojson({
         'message': 'Recurring payment created successfully',
         'recurring_payment': recurring_payment.to_dict()
     }), 201
@@ -413,91 +673,104 @@ def create_recurring_payment():
 @bank_bp.route('/recurring_payments', methods=['GET'])
 def get_recurring_payments():
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     # Get all business accounts for the user
-    business_accounts = Account.query.filter_by(
-        user_id=session['user_id'],
-        account_type='business'
-    ).all()
+    business_accounts = db.session.execute(
+        select(Account).where(
+            Account.user_id == session['user_id'],
+            Account.account_type == 'business'
+        )
+    ).scalars().all()
     
     if not business_accounts:
-        return jsonify([]), 200
+        return empty_list_response(), 200
     
     business_account_ids = [account.id for account in business_accounts]
     
-    # Get all recurring payments for user's business accounts
-    recurring_payments = RecurringPayment.query.filter(
-        RecurringPayment.from_account_id.in_(business_account_ids)
-    ).all()
-    
-    return jsonify([payment.to_dict() for payment in recurring_payments]), 200
+    # Get all recurring payments for user's business accounts, with the
+    # accounts and recipient owner that to_dict() needs loaded up front
+    recurring_payments = db.session.execute(
+        select(RecurringPayment).options(
+            selectinload(RecurringPayment.from_account),
+            selectinload(RecurringPayment.to_account).selectinload(Account.owner)
+        ).where(
+            RecurringPayment.from_account_id.in_(business_account_ids)
+        )
+    ).scalars().all()
+    
+    if not recurring_payments:
+        return empty_list_response(), 200
+    
+    return ojson([payment.to_dict() for payment in recurring_payments]), 200
 
 @bank_bp.route('/recurring_payments/<int:payment_id>', methods=['DELETE'])
 def cancel_recurring_payment(payment_id):
     if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
+        return ojson({'error': 'Not logged in'}), 401
     
     # Find the recurring payment
-    recurring_payment = RecurringPayment.query.get(payment_id)
+    recurring_payment = db.session.get(RecurringPayment, payment_id)
     if not recurring_payment:
-        return jsonify({'error': 'Recurring payment not found'}), 404
+        return ojson({'error': 'Recurring payment not found'}), 404
     
     # Verify the payment belongs to user's business account
-    business_account = Account.query.filter_by(
-        id=recurring_payment.from_account_id,
-        user_id=session['user_id'],
-        account_type='business'
-    ).first()
+    business_account = get_account_ref_by_id(recurring_payment.from_account_id)
     
-    if not business_account:
-        return jsonify({'error': 'Unauthorized to cancel this payment'}), 403
+    if (not business_account
+            or business_account['user_id'] != session['user_id']
+            or business_account['account_type'] != 'business'):
+        return ojson({'error': 'Unauthorized to cancel this payment'}), 403
     
     # Mark as inactive instead of deleting
     recurring_payment.is_active = False
     db.session.commit()
     
-    return jsonify({'message': 'Recurring payment cancelled successfully'}), 200
+    return ojson({'message': 'Recurring payment cancelled successfully'}), 200
 
-@bank_bp.route('/process_recurring_payments', methods=['POST'])
-def process_recurring_payments():
-    current_time = datetime.utcnow()
-    
-    # Find all active recurring payments that are due
-    due_payments = RecurringPayment.query.filter(
-        RecurringPayment.is_active == True,
-        RecurringPayment.next_payment_date <= current_time
-    ).all()
-    
+# Due payments are locked and processed in chunks of this size, committing after each
+RECURRING_PAYMENT_BATCH_SIZE = 500
+
+def _apply_payment_batch(due_payments, balances, current_time):
+    # balances holds the starting balance of every account the batch touches and is updated
+    # as a running total, so several payments drawing on one account see each other.
+    # Returns None, with nothing applied, if a debit no longer fits the account's current balance.
     processed_count = 0
     failed_count = 0
     
+    # Collect all writes and flush them as bulk statements after the loop
+    tx_rows = []
+    account_deltas = {}
+    payment_updates = []
+    
     for payment in due_payments:
         try:
+            from_id = payment.from_account_id
+            to_id = payment.to_account_id
+            # Calculate next payment date before touching any running totals
+            next_payment_date = advance_payment_date(
+                payment.created_at, payment.next_payment_date, payment.frequency
+            )
+            
             # Check if business account has sufficient funds
-            if payment.from_account.balance >= payment.amount:
+            if balances[from_id] >= payment.amount:
                 # Process the payment
-                payment.from_account.balance -= payment.amount
-                payment.to_account.balance += payment.amount
+                balances[from_id] -= payment.amount
+                balances[to_id] += payment.amount
+                account_deltas[from_id] = account_deltas.get(from_id, 0) - payment.amount
+                account_deltas[to_id] = account_deltas.get(to_id, 0) + payment.amount
                 
                 # Create transaction record
-                transaction = Transaction(
-                    from_account_id=payment.from_account_id,
-                    to_account_id=payment.to_account_id,
-                    amount=payment.amount,
-                    description=f'SALARY: {payment.description}',
-                    transaction_type='salary'
-                )
-                
-                db.session.add(transaction)
+                tx_rows.append({
+                    'from_account_id': from_id,
+                    'to_account_id': to_id,
+                    'amount': payment.amount,
+                    'description': f'SALARY: {payment.description}',
+                    'transaction_type': 'salary',
+                    'created_at': current_time
+                })
                 
-                # Calculate next payment date
-                if payment.frequency == 'weekly':
-                    payment.next_payment_date += timedelta(weeks=1)
-                elif payment.frequency == 'monthly':
-                    payment.next_payment_date += timedelta(days=30)
-                elif payment.frequency == 'yearly':
-                    payment.next_payment_date += timedelta(days=365)
+                payment_updates.append({'pid': payment.id, 'next_date': next_payment_date})
                 
                 processed_count += 1
             else:
@@ -508,11 +781,113 @@ def process_recurring_payments():
             failed_count += 1
             continue
     
-    db.session.commit()
+    if tx_rows:
+        # Debits are conditional, like debit_account(), since the balances read above may be
+        # stale by now; every one of them has to apply or the caller retries the chunk
+        debits = [{'aid': aid, 'delta': delta} for aid, delta in account_deltas.items() if delta < 0]
+        credits = [{'aid': aid, 'delta': delta} for aid, delta in account_deltas.items() if delta >= 0]
+        if debits:
+            result = db.session.connection().execute(
+                update(Account)
+                .where(Account.id == bindparam('aid'), Account.balance + bindparam('delta') >= 0)
+                .values(balance=Account.balance + bindparam('delta')),
+                debits
+            )
+            if result.rowcount != len(debits):
+                return None
+        if credits:
+            db.session.connection().execute(
+                update(Account)
+                .where(Account.id == bindparam('aid'))
+                .values(balance=Account.balance + bindparam('delta')),
+                credits
+            )
+        db.session.execute(insert(Transaction), tx_rows)
+        db.session.connection().execute(
+            update(RecurringPayment)
+            .where(RecurringPayment.id == bindparam('pid'))
+            .values(next_payment_date=bindparam('next_date')),
+            payment_updates
+        )
+    
+    return processed_count, failed_count
+
+def process_due_recurring_payments(batch_size=RECURRING_PAYMENT_BATCH_SIZE):
+    current_time = utcnow()
+    
+    # Balances are read from the account rows below, so the loop only needs ids.
+    # In development, fail fast on any relationship access.
+    query_options = []
+    if current_app.debug:
+        query_options.append(raiseload('*'))
     
-    return jsonify({
+    processed_count = 0
+    failed_count = 0
+    last_id = 0
+    
+    while True:
+        # Find the next chunk of active recurring payments that are due. Rows locked by
+        # another worker are skipped, and walking by id keeps unpaid ones from being revisited.
+        due_payments = db.session.execute(
+            select(RecurringPayment)
+            .options(*query_options)
+            .where(
+                RecurringPayment.is_active == True,
+                RecurringPayment.next_payment_date <= current_time,
+                RecurringPayment.id > last_id
+            )
+            .order_by(RecurringPayment.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True, of=RecurringPayment)
+        ).scalars().all()
+        
+        if not due_payments:
+            break
+        
+        # Lock every account the chunk touches before reading balances, in id order to avoid
+        # deadlocks. SQLite ignores FOR UPDATE, so a transfer can still commit before the
+        # chunk's UPDATEs; the debits there are conditional and a lost race retries the chunk.
+        account_ids = {payment.from_account_id for payment in due_payments}
+        account_ids |= {payment.to_account_id for payment in due_payments}
+        balances = dict(db.session.execute(
+            select(Account.id, Account.balance)
+            .where(Account.id.in_(account_ids))
+            .order_by(Account.id)
+            .with_for_update()
+        ).all())
+        
+        applied = _apply_payment_batch(due_payments, balances, current_time)
+        if applied is None:
+            # A concurrent debit got in first; re-read the chunk and its balances
+            db.session.rollback()
+            continue
+        processed, failed = applied
+        db.session.commit()
+        
+        processed_count += processed
+        failed_count += failed
+        last_id = due_payments[-1].id
+        
+        if len(due_payments) < batch_size:
+            break
+    
+    return processed_count, failed_count
+
+@bank_bp.route('/process_recurring_payments', methods=['POST'])
+def process_recurring_payments():
+    # Hand the work to a background worker when a queue is configured
+    queue = current_app.config.get('RQ_QUEUE')
+    if queue is not None:
+        job = queue.enqueue('tasks.process_recurring_payments_job')
+        return ojson({
+            'message': 'Recurring payment processing queued',
+            'job_id': job.id
+        }), 202
+    
+    processed_count, failed_count = process_due_recurring_payments()
+    
+    return ojson({
         'message': f'Processed {processed_count} payments, {failed_count} failed',
         'processed': processed_count,
         'failed': failed_count
     }), 200
-
@@ -0,0 +1,36 @@
+# Small read-through cache for hot, rarely-changing lookups.
+# Backed by Redis when configured; otherwise every call goes straight to the loader.
+
+import orjson
+import redis
+
+class Cache:
+    def __init__(self, app=None):
+        self.client = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.client = app.config.get('CACHE_REDIS')
+
+    def get_or_set(self, key, loader, ttl=30):
+        if self.client is None:
+            return loader()
+
+        try:
+            cached = self.client.get(key)
+        except redis.RedisError:
+            return loader()
+        if cached is not None:
+            return orjson.loads(cached)
+
+        value = loader()
+        # Misses are not cached so newly created rows show up immediately
+        if value is not None:
+            try:
+                self.client.set(key, orjson.dumps(value), ex=ttl)
+            except redis.RedisError:
+                pass
+        return value
+
+cache = Cache()
@@ -1,7 +1,15 @@
 import os
 import sys
 from flask import Flask, send_from_directory, session
+from flask_session import Session
+from flask_sqlalchemy.record_queries import get_recorded_queries
 from dotenv import load_dotenv
+from rq import Queue
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers
+import redis
+import sqlite3
 
 # Add current directory to Python path for module imports
 project_root = os.path.abspath(os.path.dirname(__file__))
@@ -13,7 +21,8 @@ import bank
 import user
 
 # Access db and bank_bp from the imported bank module
-from bank import db, bank_bp
+from bank import db, bank_bp, process_due_recurring_payments, migrate_amounts_to_cents, create_missing_indexes
+from cache import cache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,6 +32,21 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_very_secret_key_that_
 
 app.register_blueprint(bank_bp, url_prefix='/api')
 
+# Configure sessions - Redis server-side store or fallback to signed cookies
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    # The cookie only carries a random session id; session data lives in Redis
+    app.config['SESSION_TYPE'] = 'redis'
+    # Keep browser-session cookies, as with the default signed-cookie sessions
+    app.config['SESSION_PERMANENT'] = False
+    redis_client = redis.from_url(REDIS_URL)
+    app.config['SESSION_REDIS'] = redis_client
+    Session(app)
+    # Reuse the same connection pool for the lookup cache and the job queue
+    app.config['CACHE_REDIS'] = redis_client
+    app.config['RQ_QUEUE'] = Queue(connection=redis_client)
+
 # Configure database - Turso or fallback to SQLite
 TURSO_DATABASE_URL = os.environ.get('TURSO_DATABASE_URL')
 TURSO_AUTH_TOKEN = os.environ.get('TURSO_AUTH_TOKEN')
@@ -41,17 +65,63 @@ if TURSO_DATABASE_URL and TURSO_AUTH_TOKEN:
             'url': TURSO_DATABASE_URL, # Pass the Turso URL here
             'auth_token': TURSO_AUTH_TOKEN,
             'check_same_thread': False
-        }
+        },
+        'insertmanyvalues_page_size': 1000
     }
 else:
     # Fallback to local SQLite
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'insertmanyvalues_page_size': 1000,
+        # Size the pool for threaded workers so concurrent requests don't queue on connections
+        'pool_size': 20,
+        'max_overflow': 40,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a write is in progress
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Record queries in development so their plans can be inspected
+app.config['SQLALCHEMY_RECORD_QUERIES'] = os.environ.get('FLASK_DEBUG') == '1'
 db.init_app(app)
+cache.init_app(app)
 
 with app.app_context():
     db.create_all()
+    create_missing_indexes()
+    if migrate_amounts_to_cents():
+        app.logger.warning('Converted stored balances and amounts to integer cents')
+    # Configure mappers up front instead of on the first request
+    configure_mappers()
+
+if app.config['SQLALCHEMY_RECORD_QUERIES']:
+    @app.after_request
+    def log_query_plans(response):
+        # Log each SELECT with its SQLite query plan to spot table scans
+        connection = db.session.connection()
+        for query in get_recorded_queries():
+            if not query.statement.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + query.statement, query.parameters).all()
+            app.logger.debug('%.2fms %s\n%s', query.duration * 1000, query.statement,
+                             '\n'.join(row[-1] for row in plan))
+        return response
+
+@app.cli.command('process-recurring-payments')
+def process_recurring_payments_command():
+    # Run from cron or another scheduler, e.g. every minute
+    processed_count, failed_count = process_due_recurring_payments()
+    print(f'Processed {processed_count} payments, {failed_count} failed')
 
 @app.route('/')
 def index():
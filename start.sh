@@ -1,5 +1,9 @@
 #!/usr/bin/env bash
 
-# Start the Flask application
-exec python main.py
-
+# Start the Flask application under gunicorn with threaded workers so
+# requests waiting on the database don't block each other
+exec gunicorn main:app \
+    --worker-class gthread \
+    --workers "${WEB_CONCURRENCY:-2}" \
+    --threads "${GUNICORN_THREADS:-16}" \
+    --bind "0.0.0.0:${PORT:-5000}"
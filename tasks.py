@@ -0,0 +1,10 @@
+# Background jobs, run by an RQ worker started with:
+#   rq worker --url "$REDIS_URL"
+
+from main import app
+from bank import process_due_recurring_payments
+
+def process_recurring_payments_job():
+    with app.app_context():
+        processed_count, failed_count = process_due_recurring_payments()
+    return {'processed': processed_count, 'failed': failed_count}
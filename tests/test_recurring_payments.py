@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime, timedelta
+
+from bank import advance_payment_date
+
+
+class AdvancePaymentDateTest(unittest.TestCase):
+    def schedule(self, anchor, first_due, frequency, count):
+        dates = [first_due]
+        while len(dates) < count:
+            dates.append(advance_payment_date(anchor, dates[-1], frequency))
+        return dates
+
+    def test_monthly_month_end_returns_to_anchor_day(self):
+        created = datetime(2024, 1, 31, 9, 30, 0, 123456)
+        dates = self.schedule(created, datetime(2024, 2, 29, 9, 30, 0, 123456), 'monthly', 5)
+        self.assertEqual(
+            [d.date() for d in dates],
+            [datetime(2024, m, d).date() for m, d in ((2, 29), (3, 31), (4, 30), (5, 31), (6, 30))]
+        )
+        self.assertTrue(all(d.time() == created.time() for d in dates))
+
+    def test_yearly_leap_day(self):
+        created = datetime(2024, 2, 29, 12)
+        dates = self.schedule(created, datetime(2025, 2, 28, 12), 'yearly', 4)
+        self.assertEqual(
+            [d.date() for d in dates],
+            [datetime(y, 2, d).date() for y, d in ((2025, 28), (2026, 28), (2027, 28), (2028, 29))]
+        )
+
+    def test_weekly_steps_from_previous(self):
+        created = datetime(2024, 1, 1, 8)
+        self.assertEqual(
+            advance_payment_date(created, datetime(2024, 1, 8, 8), 'weekly'),
+            datetime(2024, 1, 15, 8)
+        )
+
+    def test_legacy_monthly_row_is_not_paid_again(self):
+        # Old rows: next_payment_date = utcnow() + 30 days, taken just before created_at
+        due = datetime(2026, 1, 31, 10, 0, 0, 500000)
+        created = due - timedelta(days=30) + timedelta(microseconds=300)
+        self.assertEqual(advance_payment_date(created, due, 'monthly'), datetime(2026, 2, 28, 10, 0, 0, 500000))
+
+    def test_legacy_yearly_row_is_not_paid_again(self):
+        due = datetime(2024, 12, 31, 10, 0, 0, 500000)
+        created = due - timedelta(days=365) + timedelta(microseconds=300)
+        self.assertEqual(advance_payment_date(created, due, 'yearly'), datetime(2025, 12, 31, 10, 0, 0, 500000))
+
+    def test_legacy_row_after_later_payments_keeps_stepping_forward(self):
+        created = datetime(2025, 6, 2, 10, 0, 0, 300)
+        due = datetime(2026, 1, 29, 10)
+        self.assertEqual(advance_payment_date(created, due, 'monthly'), datetime(2026, 2, 28, 10))
+
+    def test_missing_anchor_steps_from_previous(self):
+        self.assertEqual(advance_payment_date(None, datetime(2026, 1, 31), 'monthly'), datetime(2026, 2, 28))
+
+
+if __name__ == '__main__':
+    unittest.main()